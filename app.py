@@ -2,35 +2,123 @@ from flask import (
     Flask,
     render_template,
     request,
-    make_response,
+    Response,
     redirect,
     url_for,
     session,
+    g,
+    abort,
 )
 import sqlite3
-from datetime import datetime
 import csv
 import io
+import hashlib
+import secrets
+import threading
+import time
+from flask_caching import Cache
 from werkzeug.security import generate_password_hash, check_password_hash
 
 app = Flask(__name__)
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
 
 DB_NAME = "health_reports.db"
 app.secret_key = "change_this_in_real_project"  # for sessions
+# The forms here are a handful of short fields; reject anything larger
+# before Werkzeug spends time parsing it
+app.config["MAX_CONTENT_LENGTH"] = 16 * 1024
+app.config["MAX_FORM_MEMORY_SIZE"] = 16 * 1024
+
+# Recently verified logins, so repeat logins skip the slow password hash.
+# (email, sha256 of password) -> (expires_at, (user_id, user_name))
+LOGIN_CACHE_TTL = 60  # seconds
+LOGIN_CACHE_SIZE = 1024
+_login_cache = {}
+_login_cache_lock = threading.Lock()  # shared by all server threads
+
+
+# ---------- SQL ----------
+SQL_SELECT_USER_BY_EMAIL = "SELECT id, name, password_hash FROM users WHERE email = ?"
+
+# created_at is filled in by SQLite itself, in the same local-time
+# "YYYY-MM-DD HH:MM:SS" format the templates already display
+SQL_INSERT_USER = """
+    INSERT INTO users (name, email, password_hash, created_at)
+    VALUES (?, ?, ?, datetime('now', 'localtime'))
+"""
+
+SQL_INSERT_REPORT = """
+    INSERT INTO reports (
+        created_at, hb, sugar, bp_sys, bp_dia,
+        chol, height_cm, weight_kg, bmi, user_id
+    ) VALUES (datetime('now', 'localtime'), ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_SELECT_HISTORY_USER = """
+    SELECT id, created_at, hb, sugar, bp_sys, bp_dia, chol,
+           height_cm, weight_kg, bmi
+    FROM reports
+    WHERE user_id = ?
+    ORDER BY id ASC
+"""
+
+SQL_SELECT_HISTORY_ALL = """
+    SELECT id, created_at, hb, sugar, bp_sys, bp_dia, chol,
+           height_cm, weight_kg, bmi
+    FROM reports
+    ORDER BY id ASC
+"""
+
+# The CSV export lists the same columns as the history table
+SQL_EXPORT_USER = SQL_SELECT_HISTORY_USER
+SQL_EXPORT_ALL = SQL_SELECT_HISTORY_ALL
+
+SQL_COUNT_REPORTS = "SELECT COUNT(*) FROM reports"
+
+SQL_DELETE_USER = "DELETE FROM reports WHERE user_id = ?"
+SQL_DELETE_ALL = "DELETE FROM reports"
+SQL_DELETE_ONE_USER = "DELETE FROM reports WHERE id = ? AND user_id = ?"
+SQL_DELETE_ONE_ALL = "DELETE FROM reports WHERE id = ?"
 
 
 # ---------- DB helpers ----------
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
+def _connect():
+    conn = sqlite3.connect(DB_NAME, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # WAL is persisted in the DB file by init_db(); these are per-connection
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA mmap_size = 67108864")
+    conn.execute("PRAGMA cache_size = -8000")
     return conn
 
 
+def get_db_connection():
+    """Return the connection for the current app context, opening it once."""
+    if "db" not in g:
+        g.db = _connect()
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db_connection(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        conn.close()
+
+
 def init_db():
     """Create users and reports tables, and ensure user_id column exists."""
-    conn = get_db_connection()
+    conn = _connect()
     cur = conn.cursor()
 
+    # WAL lets /history and /export_csv read while a report is being saved
+    cur.execute("PRAGMA journal_mode = WAL")
+
+    # Apply the whole schema in one transaction so concurrent startups
+    # never see a half-migrated database
+    cur.execute("BEGIN")
+
     # Users table
     cur.execute(
         """
@@ -62,12 +150,15 @@ def init_db():
         """
     )
 
-    # Ensure user_id column exists
-    try:
+    # Ensure user_id column exists (older databases predate it)
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(reports)")}
+    if "user_id" not in columns:
         cur.execute("ALTER TABLE reports ADD COLUMN user_id INTEGER")
-    except sqlite3.OperationalError:
-        # Column already exists, ignore
-        pass
+
+    # Covers "WHERE user_id = ? ORDER BY id" without a table scan or sort
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reports_user_id_id ON reports (user_id, id)"
+    )
 
     conn.commit()
     conn.close()
@@ -78,14 +169,8 @@ def save_report(hb, sugar, bp_sys, bp_dia, chol, height_cm, weight_kg, bmi, user
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute(
-        """
-        INSERT INTO reports (
-            created_at, hb, sugar, bp_sys, bp_dia,
-            chol, height_cm, weight_kg, bmi, user_id
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        SQL_INSERT_REPORT,
         (
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             hb,
             sugar,
             bp_sys,
@@ -98,7 +183,44 @@ def save_report(hb, sugar, bp_sys, bp_dia, chol, height_cm, weight_kg, bmi, user
         ),
     )
     conn.commit()
-    conn.close()
+
+
+def bulk_save_reports(rows, user_id):
+    """Insert many health report rows in a single transaction.
+
+    Each row is (hb, sugar, bp_sys, bp_dia, chol, height_cm, weight_kg, bmi).
+    """
+    conn = get_db_connection()
+    with conn:
+        conn.executemany(
+            SQL_INSERT_REPORT,
+            ((*row, user_id) for row in rows),
+        )
+
+
+def verify_login(email, password):
+    """Return (user_id, user_name) for valid credentials, else None."""
+    key = (email, hashlib.sha256(password.encode()).hexdigest())
+    now = time.monotonic()
+    with _login_cache_lock:
+        cached = _login_cache.get(key)
+        if cached:
+            if cached[0] > now:
+                return cached[1]
+            del _login_cache[key]
+
+    cur = get_db_connection().cursor()
+    cur.execute(SQL_SELECT_USER_BY_EMAIL, (email,))
+    user = cur.fetchone()
+    if not user or not check_password_hash(user["password_hash"], password):
+        return None
+
+    with _login_cache_lock:
+        if len(_login_cache) >= LOGIN_CACHE_SIZE:
+            # dicts keep insertion order, so this drops the oldest entry
+            _login_cache.pop(next(iter(_login_cache)), None)
+        _login_cache[key] = (now + LOGIN_CACHE_TTL, (user["id"], user["name"]))
+    return user["id"], user["name"]
 
 
 def get_current_user():
@@ -106,8 +228,46 @@ def get_current_user():
     return session.get("user_id"), session.get("user_name")
 
 
+# ---------- Page Cache ----------
+# Only plain GET renders are cached; form posts always run the view
+PAGE_CACHE_TIMEOUT = 3600  # seconds
+
+
+def skip_page_cache():
+    return request.method != "GET"
+
+
+def skip_auth_page_cache():
+    # Logged-in users get a redirect, which must not be served to guests
+    return request.method != "GET" or "user_id" in session
+
+
+def index_cache_key():
+    # The page shows who is logged in, so cache one copy per user
+    return f"view/index/{session.get('user_id')}"
+
+
+def get_csrf_token():
+    """Return this session's CSRF token, creating it on first use."""
+    if "csrf_token" not in session:
+        session["csrf_token"] = secrets.token_hex(16)
+    return session["csrf_token"]
+
+
+def check_csrf_token():
+    """Abort with 400 unless the posted form carries the session's token."""
+    token = request.form.get("csrf_token") or ""
+    expected = session.get("csrf_token")
+    # Compare bytes: compare_digest rejects non-ASCII str arguments
+    if not expected or not secrets.compare_digest(
+        token.encode(), expected.encode()
+    ):
+        abort(400)
+
+
 # ---------- Auth Routes ----------
 @app.route("/register", methods=["GET", "POST"])
+@cache.cached(timeout=PAGE_CACHE_TIMEOUT, unless=skip_auth_page_cache)
 def register():
     user_id, _ = get_current_user()
     if user_id:
@@ -124,38 +284,28 @@ def register():
         else:
             conn = get_db_connection()
             cur = conn.cursor()
-            cur.execute("SELECT id FROM users WHERE email = ?", (email,))
+            cur.execute(SQL_SELECT_USER_BY_EMAIL, (email,))
             existing = cur.fetchone()
             if existing:
                 error = "Email is already registered. Please login."
             else:
                 password_hash = generate_password_hash(password)
                 cur.execute(
-                    """
-                    INSERT INTO users (name, email, password_hash, created_at)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (
-                        name,
-                        email,
-                        password_hash,
-                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    ),
+                    SQL_INSERT_USER,
+                    (name, email, password_hash),
                 )
                 conn.commit()
                 user_id = cur.lastrowid
-                conn.close()
 
                 session["user_id"] = user_id
                 session["user_name"] = name
                 return redirect(url_for("index"))
 
-            conn.close()
-
     return render_template("register.html", error=error)
 
 
 @app.route("/login", methods=["GET", "POST"])
+@cache.cached(timeout=PAGE_CACHE_TIMEOUT, unless=skip_auth_page_cache)
 def login():
     user_id, _ = get_current_user()
     if user_id:
@@ -166,15 +316,10 @@ def login():
         email = (request.form.get("email") or "").strip().lower()
         password = request.form.get("password") or ""
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM users WHERE email = ?", (email,))
-        user = cur.fetchone()
-        conn.close()
+        user = verify_login(email, password)
 
-        if user and check_password_hash(user["password_hash"], password):
-            session["user_id"] = user["id"]
-            session["user_name"] = user["name"]
+        if user:
+            session["user_id"], session["user_name"] = user
             return redirect(url_for("index"))
         else:
             error = "Invalid email or password."
@@ -188,211 +333,317 @@ def logout():
     return redirect(url_for("index"))
 
 
+# ---------- Analyzer Rules ----------
+# Form field -> parser for every value the analyzer form submits
+FORM_FIELDS = {
+    "hb": float,
+    "sugar": float,
+    "bp_sys": int,
+    "bp_dia": int,
+    "chol": float,
+    "height": float,
+    "weight": float,
+}
+
+# (status, message) outcomes, built once and shared by every request
+HB_LOW = (
+    "Low",
+    "Hemoglobin appears lower than the normal range. Consult a doctor if symptoms persist.",
+)
+HB_HIGH = (
+    "High",
+    "Hemoglobin appears higher than the normal range. A medical check-up is recommended.",
+)
+HB_NORMAL = (
+    "Normal",
+    "Hemoglobin is within the normal range.",
+)
+HB_ERROR = (
+    "Error",
+    "Please enter a valid Hemoglobin value.",
+)
+
+SUGAR_LOW = (
+    "Low",
+    "Low fasting sugar may cause dizziness or weakness.",
+)
+SUGAR_HIGH = (
+    "High",
+    "Fasting sugar appears high and may indicate diabetes. Consult a doctor.",
+)
+SUGAR_NORMAL = (
+    "Normal",
+    "Fasting sugar is within the normal range.",
+)
+SUGAR_ERROR = (
+    "Error",
+    "Please enter a valid sugar value.",
+)
+
+BP_LOW = (
+    "Low",
+    "Blood pressure is low. Hydration and rest may help.",
+)
+BP_HIGH = (
+    "High",
+    "Blood pressure is high and may pose risks. A medical consultation is recommended.",
+)
+BP_NORMAL = (
+    "Normal",
+    "Blood pressure is within the normal range.",
+)
+BP_ERROR = (
+    "Error",
+    "Please enter valid BP values.",
+)
+
+CHOL_HIGH = (
+    "High",
+    "Cholesterol is high and may increase heart disease risk.",
+)
+CHOL_BORDERLINE = (
+    "Borderline",
+    "Cholesterol is borderline high. Healthy diet and lifestyle changes may help.",
+)
+CHOL_NORMAL = (
+    "Normal",
+    "Cholesterol is within a healthy range.",
+)
+CHOL_ERROR = (
+    "Error",
+    "Please enter a valid cholesterol value.",
+)
+
+# BMI's status includes the computed value, so only the messages are shared
+BMI_UNDERWEIGHT = (
+    "Underweight",
+    "BMI indicates underweight. A balanced nutritious diet is recommended.",
+)
+BMI_OVERWEIGHT = (
+    "Overweight",
+    "BMI indicates overweight. Regular exercise and diet control are advised.",
+)
+BMI_NORMAL = (
+    "Normal",
+    "BMI is within normal limits.",
+)
+BMI_ERROR = (
+    "Error",
+    "Please enter valid height and weight.",
+)
+
+SUMMARY_STABLE = (
+    "Stable / Normal",
+    "All tracked parameters appear within normal ranges. Maintain your current lifestyle and regular check-ups.",
+)
+SUMMARY_MILD = (
+    "Mild Concern",
+    "One parameter needs attention. Monitor your health and consider lifestyle adjustments.",
+)
+SUMMARY_ATTENTION = (
+    "Needs Attention",
+    "Multiple parameters are outside the normal range. A detailed check-up and lifestyle review are recommended.",
+)
+SUMMARY_HIGH_RISK = (
+    "High Risk",
+    "Several parameters are abnormal. Please consult a doctor for a complete evaluation.",
+)
+SUMMARY_INVALID = (
+    "Data Issue",
+    "Some inputs were invalid. Please correct the highlighted fields and try again.",
+)
+SUMMARY_MISSING = (
+    "Data Issue",
+    "Please fill in all fields and try again.",
+)
+
+# Status codes; ABNORMAL_MASK has a bit set for every code that counts
+# towards the overall summary, so the check is a shift and a mask
+STATUS_NORMAL = 0
+STATUS_LOW = 1
+STATUS_HIGH = 2
+STATUS_BORDERLINE = 3
+STATUS_UNDERWEIGHT = 4
+STATUS_OVERWEIGHT = 5
+STATUS_ERROR = 6
+ABNORMAL_MASK = 0b0111110
+
+# Each metric: (result key, form fields, (low, borderline, high) limits
+# per field, outcome per status code). A value below "low" is low, above
+# "high" is high, above "borderline" is borderline; None disables a limit.
+METRICS = (
+    (
+        "Hemoglobin",
+        ("hb",),
+        ((12, None, 16),),
+        {
+            STATUS_LOW: HB_LOW,
+            STATUS_HIGH: HB_HIGH,
+            STATUS_NORMAL: HB_NORMAL,
+            STATUS_ERROR: HB_ERROR,
+        },
+    ),
+    (
+        "Fasting Sugar",
+        ("sugar",),
+        ((70, None, 125),),
+        {
+            STATUS_LOW: SUGAR_LOW,
+            STATUS_HIGH: SUGAR_HIGH,
+            STATUS_NORMAL: SUGAR_NORMAL,
+            STATUS_ERROR: SUGAR_ERROR,
+        },
+    ),
+    (
+        "Blood Pressure",
+        ("bp_sys", "bp_dia"),
+        ((90, None, 140), (60, None, 90)),
+        {
+            STATUS_LOW: BP_LOW,
+            STATUS_HIGH: BP_HIGH,
+            STATUS_NORMAL: BP_NORMAL,
+            STATUS_ERROR: BP_ERROR,
+        },
+    ),
+    (
+        "Cholesterol",
+        ("chol",),
+        ((None, 200, 240),),
+        {
+            STATUS_HIGH: CHOL_HIGH,
+            STATUS_BORDERLINE: CHOL_BORDERLINE,
+            STATUS_NORMAL: CHOL_NORMAL,
+            STATUS_ERROR: CHOL_ERROR,
+        },
+    ),
+)
+
+BMI_LIMITS = (18.5, None, 24.9)
+BMI_STATUSES = {
+    STATUS_LOW: STATUS_UNDERWEIGHT,
+    STATUS_HIGH: STATUS_OVERWEIGHT,
+    STATUS_NORMAL: STATUS_NORMAL,
+}
+BMI_OUTCOMES = {
+    STATUS_UNDERWEIGHT: BMI_UNDERWEIGHT,
+    STATUS_OVERWEIGHT: BMI_OVERWEIGHT,
+    STATUS_NORMAL: BMI_NORMAL,
+}
+
+
+def parse_or_none(parser, raw):
+    try:
+        return parser(raw)
+    except ValueError:
+        return None
+
+
+def classify(values, limits):
+    """Return the status code for values checked against matching limits.
+
+    Low on any value wins, then high, then borderline.
+    """
+    code = STATUS_NORMAL
+    for v, (low, mid, high) in zip(values, limits):
+        if low is not None and v < low:
+            return STATUS_LOW
+        if high is not None and v > high:
+            code = STATUS_HIGH
+        elif mid is not None and v > mid and code == STATUS_NORMAL:
+            code = STATUS_BORDERLINE
+    return code
+
+
 # ---------- Analyzer Route ----------
 @app.route("/", methods=["GET", "POST"])
+@cache.cached(
+    timeout=PAGE_CACHE_TIMEOUT,
+    unless=skip_page_cache,
+    make_cache_key=index_cache_key,
+)
 def index():
     result = {}
     overall_summary = None
-    bmi_value = None
 
     user_id, user_name = get_current_user()
 
     if request.method == "POST":
-        hb_raw = request.form.get("hb") or None
-        sugar_raw = request.form.get("sugar") or None
-        bp_sys_raw = request.form.get("bp_sys") or None
-        bp_dia_raw = request.form.get("bp_dia") or None
-        chol_raw = request.form.get("chol") or None
-        height_raw = request.form.get("height") or None
-        weight_raw = request.form.get("weight") or None
-
-        # 1) Hemoglobin
-        try:
-            hb = float(hb_raw)
-            if hb < 12:
-                result["Hemoglobin"] = (
-                    "Low",
-                    "Hemoglobin appears lower than the normal range. Consult a doctor if symptoms persist.",
-                )
-            elif hb > 16:
-                result["Hemoglobin"] = (
-                    "High",
-                    "Hemoglobin appears higher than the normal range. A medical check-up is recommended.",
-                )
-            else:
-                result["Hemoglobin"] = (
-                    "Normal",
-                    "Hemoglobin is within the normal range.",
-                )
-        except Exception:
-            hb = None
-            result["Hemoglobin"] = (
-                "Error",
-                "Please enter a valid Hemoglobin value.",
-            )
-
-        # 2) Fasting Sugar
-        try:
-            sugar = float(sugar_raw)
-            if sugar < 70:
-                result["Fasting Sugar"] = (
-                    "Low",
-                    "Low fasting sugar may cause dizziness or weakness.",
-                )
-            elif sugar > 125:
-                result["Fasting Sugar"] = (
-                    "High",
-                    "Fasting sugar appears high and may indicate diabetes. Consult a doctor.",
-                )
-            else:
-                result["Fasting Sugar"] = (
-                    "Normal",
-                    "Fasting sugar is within the normal range.",
-                )
-        except Exception:
-            sugar = None
-            result["Fasting Sugar"] = (
-                "Error",
-                "Please enter a valid sugar value.",
-            )
-
-        # 3) Blood Pressure
-        try:
-            bp_sys = int(bp_sys_raw)
-            bp_dia = int(bp_dia_raw)
-            if bp_sys < 90 or bp_dia < 60:
-                result["Blood Pressure"] = (
-                    "Low",
-                    "Blood pressure is low. Hydration and rest may help.",
-                )
-            elif bp_sys > 140 or bp_dia > 90:
-                result["Blood Pressure"] = (
-                    "High",
-                    "Blood pressure is high and may pose risks. A medical consultation is recommended.",
-                )
-            else:
-                result["Blood Pressure"] = (
-                    "Normal",
-                    "Blood pressure is within the normal range.",
-                )
-        except Exception:
-            bp_sys = bp_dia = None
-            result["Blood Pressure"] = (
-                "Error",
-                "Please enter valid BP values.",
+        form = request.form
+        raw = {f: (form.get(f) or "").strip() for f in FORM_FIELDS}
+
+        # The form marks every field required, so a partial submission
+        # gets one message instead of a per-metric breakdown
+        if not all(raw.values()):
+            return render_template(
+                "index.html",
+                result=result,
+                overall_summary=SUMMARY_MISSING,
+                user_name=user_name,
+                user_id=user_id,
             )
 
-        # 4) Cholesterol
+        # Parse everything in one go; only a bad value pays for the
+        # field-by-field pass that pinpoints which metric to flag
         try:
-            chol = float(chol_raw)
-            if chol > 240:
-                result["Cholesterol"] = (
-                    "High",
-                    "Cholesterol is high and may increase heart disease risk.",
-                )
-            elif chol > 200:
-                result["Cholesterol"] = (
-                    "Borderline",
-                    "Cholesterol is borderline high. Healthy diet and lifestyle changes may help.",
-                )
-            else:
-                result["Cholesterol"] = (
-                    "Normal",
-                    "Cholesterol is within a healthy range.",
-                )
-        except Exception:
-            chol = None
-            result["Cholesterol"] = (
-                "Error",
-                "Please enter a valid cholesterol value.",
-            )
-
-        # 5) BMI
-        try:
-            height_cm = float(height_raw)
-            weight_kg = float(weight_raw)
+            values = {f: parse(raw[f]) for f, parse in FORM_FIELDS.items()}
+        except ValueError:
+            values = {f: parse_or_none(parse, raw[f]) for f, parse in FORM_FIELDS.items()}
+
+        # Bits of every status code seen; abnormal codes are also counted
+        seen = 0
+        abnormal_count = 0
+        for name, fields, limits, outcomes in METRICS:
+            parsed = [values[f] for f in fields]
+            code = STATUS_ERROR if None in parsed else classify(parsed, limits)
+            seen |= 1 << code
+            abnormal_count += ABNORMAL_MASK >> code & 1
+            result[name] = outcomes[code]
+
+        # BMI is derived from height and weight
+        height_cm, weight_kg = values["height"], values["weight"]
+        bmi_value = None
+        if height_cm is not None and weight_kg is not None:
             height_m = height_cm / 100.0
-            bmi_value = weight_kg / (height_m * height_m)
-
-            if bmi_value < 18.5:
-                result["BMI"] = (
-                    f"{bmi_value:.1f} (Underweight)",
-                    "BMI indicates underweight. A balanced nutritious diet is recommended.",
-                )
-            elif bmi_value > 24.9:
-                result["BMI"] = (
-                    f"{bmi_value:.1f} (Overweight)",
-                    "BMI indicates overweight. Regular exercise and diet control are advised.",
-                )
-            else:
-                result["BMI"] = (
-                    f"{bmi_value:.1f} (Normal)",
-                    "BMI is within normal limits.",
-                )
-        except Exception:
-            height_cm = weight_kg = None
-            result["BMI"] = (
-                "Error",
-                "Please enter valid height and weight.",
-            )
+            denom = height_m * height_m
+            # Tiny heights underflow to 0.0 here, not just a literal 0
+            if denom != 0:
+                bmi_value = weight_kg / denom
+
+        if bmi_value is None:
+            code = STATUS_ERROR
+            result["BMI"] = BMI_ERROR
+        else:
+            values["bmi"] = bmi_value
+            code = BMI_STATUSES[classify((bmi_value,), (BMI_LIMITS,))]
+            label, message = BMI_OUTCOMES[code]
+            result["BMI"] = (f"{bmi_value:.1f} ({label})", message)
+        seen |= 1 << code
+        abnormal_count += ABNORMAL_MASK >> code & 1
 
         # --------- Overall summary based on all statuses ----------
-        if result:
-            statuses = [v[0] for v in result.values()]
-
-            if any(s == "Error" or s.startswith("Error") for s in statuses):
-                overall_summary = (
-                    "Data Issue",
-                    "Some inputs were invalid. Please correct the highlighted fields and try again.",
-                )
+        if seen >> STATUS_ERROR & 1:
+            overall_summary = SUMMARY_INVALID
+        else:
+            if abnormal_count == 0:
+                overall_summary = SUMMARY_STABLE
+            elif abnormal_count == 1:
+                overall_summary = SUMMARY_MILD
+            elif 2 <= abnormal_count <= 3:
+                overall_summary = SUMMARY_ATTENTION
             else:
-                abnormal_count = 0
-                for s in statuses:
-                    if (
-                        s.startswith("High")
-                        or s.startswith("Low")
-                        or "Underweight" in s
-                        or "Overweight" in s
-                        or s == "Borderline"
-                    ):
-                        abnormal_count += 1
-
-                if abnormal_count == 0:
-                    overall_summary = (
-                        "Stable / Normal",
-                        "All tracked parameters appear within normal ranges. Maintain your current lifestyle and regular check-ups.",
-                    )
-                elif abnormal_count == 1:
-                    overall_summary = (
-                        "Mild Concern",
-                        "One parameter needs attention. Monitor your health and consider lifestyle adjustments.",
-                    )
-                elif 2 <= abnormal_count <= 3:
-                    overall_summary = (
-                        "Needs Attention",
-                        "Multiple parameters are outside the normal range. A detailed check-up and lifestyle review are recommended.",
-                    )
-                else:
-                    overall_summary = (
-                        "High Risk",
-                        "Several parameters are abnormal. Please consult a doctor for a complete evaluation.",
-                    )
-
-        # Save only if all values are valid
-        if all(
-            v is not None
-            for v in [hb, sugar, bp_sys, bp_dia, chol, height_cm, weight_kg, bmi_value]
-        ):
+                overall_summary = SUMMARY_HIGH_RISK
+
+            # Save only if all values are valid
             # if not logged in, user_id will be None (treated as guest)
             save_report(
-                hb,
-                sugar,
-                bp_sys,
-                bp_dia,
-                chol,
-                height_cm,
-                weight_kg,
-                bmi_value,
+                values["hb"],
+                values["sugar"],
+                values["bp_sys"],
+                values["bp_dia"],
+                values["chol"],
+                values["height"],
+                values["weight"],
+                values["bmi"],
                 user_id,
             )
 
@@ -406,40 +657,47 @@ def index():
 
 
 # ---------- History + Chart Data ----------
+CHART_MAX_POINTS = 500  # longer histories are averaged down to this many
+
+
+def bucket_means(values, size):
+    """Average consecutive runs of size values, skipping missing ones."""
+    means = []
+    for start in range(0, len(values), size):
+        chunk = [v for v in values[start:start + size] if v is not None]
+        means.append(sum(chunk) / len(chunk) if chunk else None)
+    return means
+
+
 @app.route("/history")
 def history():
     user_id, user_name = get_current_user()
     conn = get_db_connection()
     cur = conn.cursor()
+    # Plain tuples: the page only unpacks rows positionally
+    cur.row_factory = None
 
     if user_id:
-        cur.execute(
-            """
-            SELECT id, created_at, hb, sugar, bp_sys, bp_dia, chol,
-                   height_cm, weight_kg, bmi, user_id
-            FROM reports
-            WHERE user_id = ?
-            ORDER BY id ASC
-            """,
-            (user_id,),
-        )
+        cur.execute(SQL_SELECT_HISTORY_USER, (user_id,))
     else:
         # Not logged in: show all reports (guest mode)
-        cur.execute(
-            """
-            SELECT id, created_at, hb, sugar, bp_sys, bp_dia, chol,
-                   height_cm, weight_kg, bmi, user_id
-            FROM reports
-            ORDER BY id ASC
-            """
-        )
+        cur.execute(SQL_SELECT_HISTORY_ALL)
 
     rows = cur.fetchall()
-    conn.close()
 
-    labels = [row[1] for row in rows]       # created_at timestamps
-    sugar_values = [row[3] for row in rows] # fasting sugar
-    bmi_values = [row[9] for row in rows]   # BMI
+    # Transpose once instead of walking rows per chart series
+    columns = tuple(zip(*rows)) or ((),) * len(cur.description)
+    labels = columns[1]        # created_at timestamps
+    sugar_values = columns[3]  # fasting sugar
+    bmi_values = columns[9]    # BMI
+
+    # Chart.js cannot show thousands of points usefully anyway, so send
+    # one averaged point per bucket and keep the JSON payload small
+    if len(rows) > CHART_MAX_POINTS:
+        size = -(-len(rows) // CHART_MAX_POINTS)  # ceiling division
+        labels = labels[::size]
+        sugar_values = bucket_means(sugar_values, size)
+        bmi_values = bucket_means(bmi_values, size)
 
     return render_template(
         "history.html",
@@ -449,102 +707,112 @@ def history():
         bmi_values=bmi_values,
         user_name=user_name,
         user_id=user_id,
+        csrf_token=get_csrf_token(),
     )
 
 
 # ---------- CSV Export ----------
+GUEST_EXPORT_MAX_ROWS = 10000  # larger guest exports require logging in
+
+
 @app.route("/export_csv")
 def export_csv():
     user_id, _ = get_current_user()
-    conn = get_db_connection()
+
+    # Guest mode exports every report in the database; don't let an
+    # anonymous request pin a worker on an unbounded table read
+    if not user_id:
+        total = get_db_connection().execute(SQL_COUNT_REPORTS).fetchone()[0]
+        if total > GUEST_EXPORT_MAX_ROWS:
+            return redirect(url_for("login"))
+
+    # Own connection: the response body is produced after the app context
+    # (and its g.db) has been torn down, so the generator closes this one
+    conn = _connect()
+    conn.row_factory = None  # csv.writer only needs plain tuples
     cur = conn.cursor()
 
     if user_id:
-        cur.execute(
-            """
-            SELECT id, created_at, hb, sugar, bp_sys, bp_dia, chol,
-                   height_cm, weight_kg, bmi
-            FROM reports
-            WHERE user_id = ?
-            ORDER BY id ASC
-            """,
-            (user_id,),
-        )
+        cur.execute(SQL_EXPORT_USER, (user_id,))
     else:
-        cur.execute(
-            """
-            SELECT id, created_at, hb, sugar, bp_sys, bp_dia, chol,
-                   height_cm, weight_kg, bmi
-            FROM reports
-            ORDER BY id ASC
-            """
+        cur.execute(SQL_EXPORT_ALL)
+
+    def generate():
+        # Reuse one small buffer and yield it row by row instead of
+        # materializing the whole result set and CSV in memory
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(
+            [
+                "ID",
+                "Created At",
+                "Hemoglobin",
+                "Fasting Sugar",
+                "BP Systolic",
+                "BP Diastolic",
+                "Cholesterol",
+                "Height (cm)",
+                "Weight (kg)",
+                "BMI",
+            ]
         )
+        try:
+            for row in cur:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+                writer.writerow(row)
+            yield output.getvalue()
+        finally:
+            conn.close()
 
-    rows = cur.fetchall()
-    conn.close()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(
-        [
-            "ID",
-            "Created At",
-            "Hemoglobin",
-            "Fasting Sugar",
-            "BP Systolic",
-            "BP Diastolic",
-            "Cholesterol",
-            "Height (cm)",
-            "Weight (kg)",
-            "BMI",
-        ]
+    return Response(
+        generate(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=health_reports.csv"},
     )
-    writer.writerows(rows)
-
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = "attachment; filename=health_reports.csv"
-    response.headers["Content-Type"] = "text/csv"
-    return response
 
 
 # ---------- Clear ALL History (for that user) ----------
-@app.route("/clear_history")
+@app.route("/clear_history", methods=["POST"])
 def clear_history():
+    check_csrf_token()
     user_id, _ = get_current_user()
     conn = get_db_connection()
     cur = conn.cursor()
 
     if user_id:
-        cur.execute("DELETE FROM reports WHERE user_id = ?", (user_id,))
+        cur.execute(SQL_DELETE_USER, (user_id,))
     else:
         # guest mode: clear everything
-        cur.execute("DELETE FROM reports")
+        cur.execute(SQL_DELETE_ALL)
 
     conn.commit()
-    conn.close()
     return redirect(url_for("history"))
 
 
 # ---------- Delete SINGLE Report ----------
-@app.route("/delete/<int:report_id>")
+@app.route("/delete/<int:report_id>", methods=["POST"])
 def delete_report(report_id):
+    check_csrf_token()
     user_id, _ = get_current_user()
     conn = get_db_connection()
     cur = conn.cursor()
 
     if user_id:
-        cur.execute(
-            "DELETE FROM reports WHERE id = ? AND user_id = ?",
-            (report_id, user_id),
-        )
+        cur.execute(SQL_DELETE_ONE_USER, (report_id, user_id))
     else:
-        cur.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+        cur.execute(SQL_DELETE_ONE_ALL, (report_id,))
 
     conn.commit()
-    conn.close()
     return redirect(url_for("history"))
 
 
 if __name__ == "__main__":
+    from waitress import serve
+
     init_db()
-    app.run(debug=True)
+    # Multi-threaded WSGI server: with WAL and one connection per request,
+    # history/export reads run alongside report inserts.
+    # For auto-reload while developing use: flask --app app run --debug
+    serve(app, host="127.0.0.1", port=5000, threads=8)